@@ -3,9 +3,14 @@ Command-line interface for the budget manager.
 """
 
 import argparse
+import csv
 import os
+import shlex
 import sqlite3
-from typing import Optional
+import sys
+from contextlib import closing, contextmanager
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
 
 from . import db
 
@@ -15,6 +20,28 @@ def _get_conn_or_exit(dbpath: str) -> sqlite3.Connection:
         raise SystemExit(1)
     return db.connect(dbpath)
 
+# Number of formatted lines cmd_list collects per stdout write
+_WRITE_CHUNK = 1024
+# One cmd_list output line: id, date, type, amount, category, description
+_LIST_LINE = "{:4d} | {} | {:7s} | {:10.2f} | {:15s} | {}"
+
+# Connections kept open by a running shell, by database path
+_shared_conns: Dict[str, sqlite3.Connection] = {}
+
+@contextmanager
+def _open_db(dbpath: str) -> Iterator[sqlite3.Connection]:
+    # The whole command is one transaction: committed on success, rolled back
+    # on any error (including SystemExit). Outside a shell each command gets
+    # its own connection, closed afterwards.
+    shared = _shared_conns.get(dbpath)
+    if shared is not None:
+        with shared:
+            yield shared
+        return
+    conn = _get_conn_or_exit(dbpath)
+    with closing(conn), conn:
+        yield conn
+
 def cmd_init(args):
     dbpath = args.db
     os.makedirs(os.path.dirname(dbpath) or ".", exist_ok=True)
@@ -22,37 +49,65 @@ def cmd_init(args):
     print(f"Initialized database at {dbpath}")
 
 def cmd_add_category(args):
-    conn = _get_conn_or_exit(args.db)
-    cid = db.add_category(conn, args.name)
+    with _open_db(args.db) as conn:
+        cid = db.add_category(conn, args.name)
     print(f"Category '{args.name}' -> id {cid}")
 
 def cmd_add_transaction(args):
-    conn = _get_conn_or_exit(args.db)
-    try:
-        tid = db.add_transaction(conn, date=args.date, amount=args.amount, ttype=args.type, category=args.category, description=args.description)
-    except ValueError as e:
-        print("Error:", e)
-        raise SystemExit(1)
+    with _open_db(args.db) as conn:
+        try:
+            tid = db.add_transaction(conn, date=args.date, amount=args.amount, ttype=args.type, category=args.category, description=args.description)
+        except ValueError as e:
+            print("Error:", e)
+            raise SystemExit(1)
     print(f"Added transaction {tid}")
 
+def cmd_import(args):
+    with _open_db(args.db) as conn:
+        try:
+            with open(args.csv, newline="") as f:
+                count = db.add_transactions_bulk(conn, csv.DictReader(f))
+        except KeyError as e:
+            print(f"Error: missing column {e}")
+            raise SystemExit(1)
+        except OSError as e:
+            print(f"Error: cannot read {args.csv}: {e.strerror}")
+            raise SystemExit(1)
+        except csv.Error as e:
+            print(f"Error: cannot parse {args.csv}: {e}")
+            raise SystemExit(1)
+        except ValueError as e:
+            print("Error:", e)
+            raise SystemExit(1)
+    print(f"Imported {count} transactions")
+
 def cmd_list(args):
-    conn = _get_conn_or_exit(args.db)
-    rows = db.list_transactions(conn, limit=args.limit)
-    if not rows:
+    with _open_db(args.db) as conn:
+        rows = db.list_transactions(conn, limit=args.limit)
+        fmt = _LIST_LINE.format
+        found = False
+        while True:
+            chunk = list(islice(rows, _WRITE_CHUNK))
+            if not chunk:
+                break
+            found = True
+            sys.stdout.write("\n".join([
+                fmt(tid, tdate, ttype, amount, cat or "Uncategorized", desc or "")
+                for tid, tdate, amount, ttype, cat, desc in chunk
+            ]) + "\n")
+    if not found:
         print("No transactions found.")
         return
-    for r in rows:
-        cat = r["category"] or "Uncategorized"
-        print(f"{r['id']:4d} | {r['date']} | {r['type']:7s} | {r['amount']:10.2f} | {cat:15s} | {r['description'] or ''}")
+    sys.stdout.flush()
 
 def cmd_balance(args):
-    conn = _get_conn_or_exit(args.db)
-    bal = db.get_balance(conn)
+    with _open_db(args.db) as conn:
+        bal = db.get_balance(conn)
     print(f"Balance: {bal:.2f}")
 
 def cmd_report(args):
-    conn = _get_conn_or_exit(args.db)
-    report = db.monthly_report(conn, args.year, args.month)
+    with _open_db(args.db) as conn:
+        report = db.monthly_report(conn, args.year, args.month)
     print(f"Report for {report['year']}-{report['month']:02d}")
     print(f"Income:  {report['income']:.2f}")
     print(f"Expense: {report['expense']:.2f}")
@@ -62,44 +117,122 @@ def cmd_report(args):
     for c in report["by_category"]:
         print(f"  {c['category'] or 'Uncategorized':20s} {c['net']:10.2f}")
 
-def build_parser():
+def cmd_shell(args):
+    # One connection for every command read from stdin, so SQLite's page
+    # cache and the connection setup are reused between commands
+    conn = _get_conn_or_exit(args.db)
+    _shared_conns[args.db] = conn
+    parser = build_parser()
+    prompt = "budget> " if sys.stdin.isatty() else ""
+    try:
+        while True:
+            try:
+                line = input(prompt)
+            except EOFError:
+                break
+            try:
+                argv = shlex.split(line, comments=True)
+            except ValueError as e:
+                print("Error:", e)
+                continue
+            if not argv:
+                continue
+            if argv[0] in ("exit", "quit"):
+                break
+            try:
+                # Commands default to the shell's --db unless they pass their own
+                cmd_args = parser.parse_args(argv, namespace=argparse.Namespace(db=args.db))
+                if cmd_args.func is cmd_shell:
+                    print("Error: already in a shell")
+                    continue
+                cmd_args.func(cmd_args)
+            except SystemExit:
+                # Usage errors and failed commands end the command, not the shell
+                continue
+            except Exception as e:
+                print("Unhandled error:", e)
+    finally:
+        del _shared_conns[args.db]
+        conn.close()
+
+def _add_category_args(p):
+    p.add_argument("name")
+
+def _add_transaction_args(p):
+    p.add_argument("--type", choices=["income", "expense"], required=True)
+    p.add_argument("--date", required=True, help="YYYY-MM-DD")
+    p.add_argument("--amount", type=float, required=True)
+    p.add_argument("--category", help="Category name")
+    p.add_argument("--description", help="Optional description")
+
+def _import_args(p):
+    p.add_argument("csv", help="CSV with columns date,amount,type,category,description")
+
+def _list_args(p):
+    p.add_argument("--limit", type=int, help="Limit number of rows")
+
+def _report_args(p):
+    p.add_argument("--year", type=int, required=True)
+    p.add_argument("--month", type=int, required=True, choices=range(1, 13))
+
+def _no_args(p):
+    pass
+
+# name -> (help, function adding the subcommand's arguments, handler)
+SUBCOMMANDS = {
+    "init": ("Initialize database", _no_args, cmd_init),
+    "add-category": ("Add a category", _add_category_args, cmd_add_category),
+    "add": ("Add a transaction", _add_transaction_args, cmd_add_transaction),
+    "import": ("Import transactions from a CSV file", _import_args, cmd_import),
+    "list": ("List transactions", _list_args, cmd_list),
+    "balance": ("Show current balance", _no_args, cmd_balance),
+    "report": ("Monthly report", _report_args, cmd_report),
+    "shell": ("Read commands from stdin using one database connection", _no_args, cmd_shell),
+}
+
+def _build_global_parser():
     parser = argparse.ArgumentParser(prog="budget-manager")
     parser.add_argument("--db", default="data/budget.db", help="Path to sqlite database file")
+    return parser
 
+def build_parser():
+    parser = _build_global_parser()
     sub = parser.add_subparsers(dest="cmd", required=True)
-
-    p_init = sub.add_parser("init", help="Initialize database")
-    p_init.set_defaults(func=cmd_init)
-
-    p_add_cat = sub.add_parser("add-category", help="Add a category")
-    p_add_cat.add_argument("name")
-    p_add_cat.set_defaults(func=cmd_add_category)
-
-    p_add = sub.add_parser("add", help="Add a transaction")
-    p_add.add_argument("--type", choices=["income", "expense"], required=True)
-    p_add.add_argument("--date", required=True, help="YYYY-MM-DD")
-    p_add.add_argument("--amount", type=float, required=True)
-    p_add.add_argument("--category", help="Category name")
-    p_add.add_argument("--description", help="Optional description")
-    p_add.set_defaults(func=cmd_add_transaction)
-
-    p_list = sub.add_parser("list", help="List transactions")
-    p_list.add_argument("--limit", type=int, help="Limit number of rows")
-    p_list.set_defaults(func=cmd_list)
-
-    p_bal = sub.add_parser("balance", help="Show current balance")
-    p_bal.set_defaults(func=cmd_balance)
-
-    p_rep = sub.add_parser("report", help="Monthly report")
-    p_rep.add_argument("--year", type=int, required=True)
-    p_rep.add_argument("--month", type=int, required=True, choices=list(range(1, 13)))
-    p_rep.set_defaults(func=cmd_report)
-
+    for name, (help_text, add_args, func) in SUBCOMMANDS.items():
+        p = sub.add_parser(name, help=help_text)
+        add_args(p)
+        p.set_defaults(func=func)
     return parser
 
-def main():
-    parser = build_parser()
-    args = parser.parse_args()
+def parse_args(argv):
+    """
+    Parse argv, building only the parser of the requested subcommand.
+
+    Falls back to the full parser from build_parser() for top-level --help,
+    unknown commands and unrecognized arguments, so usage and error messages
+    match the full parser's.
+    """
+    # Skip the global options to find the subcommand name
+    i = 0
+    while i < len(argv) and (argv[i] == "--db" or argv[i].startswith("--db=")):
+        i += 1 if "=" in argv[i] else 2
+    if i >= len(argv) or argv[i] not in SUBCOMMANDS:
+        return build_parser().parse_args(argv)
+
+    name = argv[i]
+    _, add_args, func = SUBCOMMANDS[name]
+    args = _build_global_parser().parse_args(argv[:i])
+    p = argparse.ArgumentParser(prog=f"budget-manager {name}")
+    add_args(p)
+    p.set_defaults(func=func, cmd=name)
+    args, extra = p.parse_known_args(argv[i + 1:], namespace=args)
+    if extra:
+        # The full parser reports unrecognized arguments at the top level
+        return build_parser().parse_args(argv)
+    return args
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
     try:
         args.func(args)
     except SystemExit:
@@ -107,4 +240,3 @@ def main():
     except Exception as e:
         print("Unhandled error:", e)
         raise
-
@@ -1,17 +1,18 @@
 """
 Simple SQLite-backed database layer for the budget manager.
 Uses built-in sqlite3 (no external dependencies).
+
+Write helpers do not commit: callers group a unit of work in `with conn:`.
 """
 
+import math
+import re
 import sqlite3
 from contextlib import closing
-from datetime import datetime
-from typing import Optional, List, Dict, Tuple
+from typing import Optional, List, Dict, Tuple, Iterable, Iterator
 
 
 SCHEMA = """
-PRAGMA foreign_keys = ON;
-
 CREATE TABLE IF NOT EXISTS categories (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL UNIQUE
@@ -26,12 +27,58 @@ CREATE TABLE IF NOT EXISTS transactions (
     description TEXT,
     FOREIGN KEY(category_id) REFERENCES categories(id) ON DELETE SET NULL
 );
+
+CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions(date);
 """
 
+# Connection settings. Apart from journal_mode these are not stored in the
+# database file, so they are issued every time a connection is opened.
+PRAGMAS = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -20000;
+PRAGMA foreign_keys = ON;
+PRAGMA mmap_size = 268435456;
+"""
+
+
+class BMConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that remembers category name -> id lookups.
+
+    Categories are never renamed, so the cache only has to be dropped when a
+    transaction that may have created one is rolled back.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cat_cache: Dict[str, int] = {}
+
+    def rollback(self) -> None:
+        self._cat_cache.clear()
+        super().rollback()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self._cat_cache.clear()
+        try:
+            return super().__exit__(exc_type, exc, tb)
+        except BaseException:
+            # A failed COMMIT is rolled back without going through rollback()
+            self._cat_cache.clear()
+            raise
+
 
 def connect(path: str) -> sqlite3.Connection:
-    conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+    conn = sqlite3.connect(
+        path,
+        detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+        factory=BMConnection,
+        cached_statements=256,
+    )
     conn.row_factory = sqlite3.Row
+    conn.executescript(PRAGMAS)
     return conn
 
 
@@ -42,26 +89,70 @@ def init_db(path: str) -> None:
         conn.commit()
 
 
+def iter_rows_fast(conn: sqlite3.Connection, sql: str, params=()) -> sqlite3.Cursor:
+    """
+    Run a query on a cursor that yields plain tuples instead of sqlite3.Row objects.
+
+    Used for result sets that may be large, where building a Row (or a dict
+    from it) per row is the dominant cost. Only this cursor is affected; the
+    connection keeps its row_factory.
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur.execute(sql, params)
+
+
+def fetch_rows_fast(conn: sqlite3.Connection, sql: str, params=()) -> List[tuple]:
+    return iter_rows_fast(conn, sql, params).fetchall()
+
+
 # Category helpers
 def add_category(conn: sqlite3.Connection, name: str) -> int:
-    cur = conn.cursor()
-    try:
-        cur.execute("INSERT INTO categories(name) VALUES(?)", (name.strip(),))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        # Category exists: fall through to fetch id
-        pass
-    row = cur.execute("SELECT id FROM categories WHERE name = ?", (name.strip(),)).fetchone()
-    return row["id"]
+    name = name.strip()
+    cache = getattr(conn, "_cat_cache", None)
+    if cache is not None and name in cache:
+        return cache[name]
+
+    # Look up first: INSERT OR IGNORE would advance the AUTOINCREMENT
+    # sequence even when the name already exists
+    row = conn.execute("SELECT id FROM categories WHERE name = ?", (name,)).fetchone()
+    if row is not None:
+        cat_id = row["id"]
+    else:
+        try:
+            cat_id = conn.execute("INSERT INTO categories(name) VALUES(?)", (name,)).lastrowid
+        except sqlite3.IntegrityError:
+            # Another connection created it after our SELECT
+            cat_id = conn.execute("SELECT id FROM categories WHERE name = ?", (name,)).fetchone()["id"]
+    if cache is not None:
+        cache[name] = cat_id
+    return cat_id
+
+
+def _category_ids(conn: sqlite3.Connection, names: List[str]) -> Dict[str, int]:
+    placeholders = ",".join("?" * len(names))
+    return dict(fetch_rows_fast(conn, f"SELECT name, id FROM categories WHERE name IN ({placeholders})", names))
 
 
 def get_categories(conn: sqlite3.Connection) -> List[Tuple[int, str]]:
-    cur = conn.cursor()
-    rows = cur.execute("SELECT id, name FROM categories ORDER BY name").fetchall()
-    return [(r["id"], r["name"]) for r in rows]
+    return fetch_rows_fast(conn, "SELECT id, name FROM categories ORDER BY name")
 
 
 # Transactions
+# ASCII digits only: \d would also accept other Unicode digits
+_DATE_RE = re.compile(r"([0-9]{4})-([0-9]{2})-([0-9]{2})")
+
+
+def _validate_transaction(date: str, ttype: str) -> None:
+    # Checks the shape and month/day ranges only (e.g. 2025-02-30 passes)
+    m = _DATE_RE.fullmatch(date)
+    if not m or not (1 <= int(m.group(2)) <= 12) or not (1 <= int(m.group(3)) <= 31):
+        raise ValueError("date must be in YYYY-MM-DD format")
+
+    if ttype not in ("income", "expense"):
+        raise ValueError("type must be 'income' or 'expense'")
+
+
 def add_transaction(
     conn: sqlite3.Connection,
     date: str,
@@ -70,87 +161,121 @@ def add_transaction(
     category: Optional[str] = None,
     description: Optional[str] = None,
 ) -> int:
-    # Validate date
-    try:
-        datetime.strptime(date, "%Y-%m-%d")
-    except ValueError:
-        raise ValueError("date must be in YYYY-MM-DD format")
+    _validate_transaction(date, ttype)
 
-    if ttype not in ("income", "expense"):
-        raise ValueError("type must be 'income' or 'expense'")
-
-    category_id = None
-    if category:
-        category_id = add_category(conn, category)
-
-    cur = conn.cursor()
-    cur.execute(
+    category_id = add_category(conn, category) if category else None
+    cur = conn.execute(
         "INSERT INTO transactions(date, amount, type, category_id, description) VALUES(?,?,?,?,?)",
         (date, amount, ttype, category_id, description),
     )
-    conn.commit()
     return cur.lastrowid
 
 
-def list_transactions(conn: sqlite3.Connection, limit: Optional[int] = None) -> List[Dict]:
+def add_transactions_bulk(conn: sqlite3.Connection, rows: Iterable[Dict]) -> int:
+    """
+    Insert many transactions with executemany.
+
+    Each row is a dict with keys date, amount, type and optionally category
+    and description (the columns of a CSV export). Rows are validated up front
+    so a bad row leaves the database untouched; the ValueError names the bad
+    row, counting data rows from 1. Returns the number of rows inserted.
+    """
+    prepared = []
+    names = {}  # first-seen order, so new categories get ids in file order
+    for n, r in enumerate(rows, 1):
+        date, amount, ttype = r["date"], r["amount"], r["type"]
+        try:
+            # csv.DictReader fills the fields missing from a short line with None
+            for key, value in (("date", date), ("amount", amount), ("type", ttype)):
+                if value is None:
+                    raise ValueError(f"missing {key}")
+            _validate_transaction(date, ttype)
+            amount = float(amount)
+            # float() accepts "nan" and "inf", and overflows "1e400" to inf
+            if not math.isfinite(amount):
+                raise ValueError(f"amount must be a finite number, got {r['amount']!r}")
+        except ValueError as e:
+            raise ValueError(f"row {n}: {e}")
+        category = (r.get("category") or "").strip() or None
+        if category:
+            names[category] = None
+        prepared.append((date, amount, ttype, category, r.get("description") or None))
+
+    category_ids = {}
+    if names:
+        cache = getattr(conn, "_cat_cache", None)
+        if cache is not None:
+            category_ids = {n: cache[n] for n in names if n in cache}
+        unresolved = [n for n in names if n not in category_ids]
+        if unresolved:
+            category_ids.update(_category_ids(conn, unresolved))
+            # Plain INSERT for the new names only, for the same reason as in add_category
+            missing = [n for n in unresolved if n not in category_ids]
+            if missing:
+                try:
+                    conn.executemany("INSERT INTO categories(name) VALUES(?)", [(n,) for n in missing])
+                    category_ids.update(_category_ids(conn, missing))
+                except sqlite3.IntegrityError:
+                    # Another connection created some of them after our SELECT
+                    category_ids.update((n, add_category(conn, n)) for n in missing)
+            if cache is not None:
+                cache.update(category_ids)
+    conn.executemany(
+        "INSERT INTO transactions(date, amount, type, category_id, description) VALUES(?,?,?,?,?)",
+        ((date, amount, ttype, category_ids.get(cat), desc) for date, amount, ttype, cat, desc in prepared),
+    )
+    return len(prepared)
+
+
+def list_transactions(conn: sqlite3.Connection, limit: Optional[int] = None) -> Iterator[tuple]:
+    """
+    Yield (id, date, amount, type, category, description) tuples, newest first.
+
+    Rows are streamed from the cursor rather than fetched all at once.
+    """
     q = """
     SELECT t.id, t.date, t.amount, t.type, c.name as category, t.description
     FROM transactions t
     LEFT JOIN categories c ON t.category_id = c.id
-    ORDER BY date DESC, id DESC
+    ORDER BY t.date DESC, t.id DESC
     """
     if limit:
         q += " LIMIT ?"
-        rows = conn.execute(q, (limit,)).fetchall()
+        yield from iter_rows_fast(conn, q, (limit,))
     else:
-        rows = conn.execute(q).fetchall()
-    return [dict(r) for r in rows]
+        yield from iter_rows_fast(conn, q)
 
 
 def get_balance(conn: sqlite3.Connection) -> float:
     row = conn.execute(
         "SELECT SUM(CASE WHEN type = 'income' THEN amount WHEN type = 'expense' THEN -amount END) as bal FROM transactions"
     ).fetchone()
-    return float(row["bal"] or 0.0)
+    return row["bal"] or 0.0
 
 
 def monthly_report(conn: sqlite3.Connection, year: int, month: int) -> Dict:
-    # Return totals by category and overall
-    start = f"{year:04d}-{month:02d}-01"
-    # compute end as next month start (simple)
-    if month == 12:
-        end = f"{year+1:04d}-01-01"
-    else:
-        end = f"{year:04d}-{month+1:02d}-01"
-
-    cur = conn.cursor()
-    total_row = cur.execute(
-        """
-        SELECT
-          SUM(CASE WHEN type='income' THEN amount ELSE 0 END) as income,
-          SUM(CASE WHEN type='expense' THEN amount ELSE 0 END) as expense
-        FROM transactions
-        WHERE date >= ? AND date < ?
-        """,
-        (start, end),
-    ).fetchone()
-    income = float(total_row["income"] or 0.0)
-    expense = float(total_row["expense"] or 0.0)
+    # Return totals by category and overall. One grouped scan of the period;
+    # the overall totals are the sums of the per-category ones.
+    # The period end (next month start) is computed by SQLite from :start
+    params = {"start": f"{year:04d}-{month:02d}-01"}
 
-    cat_rows = cur.execute(
+    rows = fetch_rows_fast(
+        conn,
         """
         SELECT c.name as category,
-          SUM(CASE WHEN t.type='income' THEN t.amount WHEN t.type='expense' THEN -t.amount END) as net
+          SUM(CASE WHEN t.type='income' THEN t.amount ELSE 0 END) as income,
+          SUM(CASE WHEN t.type='expense' THEN t.amount ELSE 0 END) as expense
         FROM transactions t
         LEFT JOIN categories c ON t.category_id = c.id
-        WHERE t.date >= ? AND t.date < ?
+        WHERE t.date >= :start AND t.date < date(:start, '+1 month')
         GROUP BY c.name
-        ORDER BY net DESC
+        ORDER BY income - expense DESC
         """,
-        (start, end),
-    ).fetchall()
+        params,
+    )
 
-    categories = [{ "category": r["category"] or "Uncategorized", "net": float(r["net"] or 0.0)} for r in cat_rows]
+    income = sum(r[1] for r in rows) or 0.0
+    expense = sum(r[2] for r in rows) or 0.0
+    categories = [{"category": category or "Uncategorized", "net": (inc - exp) or 0.0} for category, inc, exp in rows]
 
     return {"year": year, "month": month, "income": income, "expense": expense, "net": income - expense, "by_category": categories}
-
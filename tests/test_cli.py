@@ -0,0 +1,162 @@
+import io
+
+import pytest
+
+from budget_manager import cli, db
+
+
+def _run(capsys, *argv):
+    """Run the CLI, returning (exit code, stdout)."""
+    try:
+        cli.main(list(argv))
+        code = 0
+    except SystemExit as e:
+        code = e.code
+    return code, capsys.readouterr().out
+
+
+def test_import(tmp_path, capsys):
+    path = str(tmp_path / "budget.db")
+    assert _run(capsys, "--db", path, "init")[0] == 0
+
+    good = tmp_path / "good.csv"
+    good.write_text(
+        "date,amount,type,category,description\n"
+        "2025-11-01,1000,income,Salary,\n"
+        "2025-11-03,40.25,expense,Groceries,Market\n"
+    )
+    code, out = _run(capsys, "--db", path, "import", str(good))
+    assert code == 0
+    assert "Imported 2 transactions" in out
+
+    # A short line fails with its row number and imports nothing
+    bad = tmp_path / "bad.csv"
+    bad.write_text("date,amount,type,category,description\n2025-11-05,5,expense,,\n2025-11-06,5\n")
+    code, out = _run(capsys, "--db", path, "import", str(bad))
+    assert code == 1
+    assert "Error: row 2: missing type" in out
+
+    code, out = _run(capsys, "--db", path, "import", str(tmp_path / "missing.csv"))
+    assert code == 1
+    assert out.startswith("Error: cannot read")
+
+    # Amounts float() accepts but the database cannot store sensibly
+    for amount in ("nan", "inf", "1e400"):
+        bad.write_text(f"date,amount,type,category,description\n2025-11-01,{amount},income,X,\n")
+        code, out = _run(capsys, "--db", path, "import", str(bad))
+        assert code == 1
+        assert out.startswith("Error: row 1: amount must be a finite number")
+
+    bad.write_text("date,amount,type,category,description\n2025-11-01,1,income,X," + "x" * 200000 + "\n")
+    code, out = _run(capsys, "--db", path, "import", str(bad))
+    assert code == 1
+    assert out.startswith("Error: cannot parse")
+
+    conn = db.connect(path)
+    assert len(list(db.list_transactions(conn))) == 2
+    conn.close()
+
+
+@pytest.mark.parametrize("argv", [
+    ["--db", "x.db", "list", "--limit", "5"],
+    ["--db=x.db", "report", "--year", "2025", "--month", "11"],
+    ["add", "--type", "expense", "--date", "2025-11-01", "--amount", "3", "--category", "Food"],
+    ["init"],
+])
+def test_parse_args_matches_full_parser(argv):
+    assert vars(cli.parse_args(argv)) == vars(cli.build_parser().parse_args(argv))
+
+
+@pytest.mark.parametrize("argv", [
+    [],
+    ["--db", "x.db"],
+    ["bogus"],
+    ["list", "--db", "x.db"],
+    ["list", "extra"],
+    ["init", "--db=x"],
+    ["report", "--year", "2025"],
+    ["report", "--year", "2025", "--month", "13"],
+])
+def test_parse_args_rejects_bad_usage(argv, capsys):
+    errors = []
+    for parse in (cli.parse_args, cli.build_parser().parse_args):
+        with pytest.raises(SystemExit) as e:
+            parse(argv)
+        assert e.value.code == 2
+        errors.append(capsys.readouterr().err)
+    assert errors[0] == errors[1]
+    assert "error:" in errors[0]
+
+
+@pytest.mark.parametrize("argv", [["--help"], ["list", "--help"], ["--db", "x.db", "add", "-h"]])
+def test_parse_args_help_matches_full_parser(argv, capsys):
+    outputs = []
+    for parse in (cli.parse_args, cli.build_parser().parse_args):
+        with pytest.raises(SystemExit) as e:
+            parse(argv)
+        assert e.value.code == 0
+        outputs.append(capsys.readouterr().out)
+    assert outputs[0] == outputs[1]
+    assert outputs[0].startswith("usage: budget-manager")
+
+
+def _init_db(tmp_path, capsys):
+    path = str(tmp_path / "budget.db")
+    assert _run(capsys, "--db", path, "init")[0] == 0
+    return path
+
+
+def test_shell_reuses_connection_and_recovers(tmp_path, capsys, monkeypatch):
+    path = _init_db(tmp_path, capsys)
+    conn = db.connect(path)
+    # Make an insert fail after add_category has already written its row
+    conn.executescript(
+        "CREATE TRIGGER boom BEFORE INSERT ON transactions WHEN NEW.description = 'boom' "
+        "BEGIN SELECT RAISE(ABORT, 'boom'); END;"
+    )
+    conn.close()
+
+    opened = []
+    real_connect = db.connect
+    monkeypatch.setattr(db, "connect", lambda p: opened.append(p) or real_connect(p))
+    monkeypatch.setattr("sys.stdin", io.StringIO(
+        "# comment line\n"
+        "\n"
+        "add --type income --date 2025-11-01 --amount 100 --category Salary\n"
+        "add --type expense --date 2025-11-02 --amount 5 --category Ghost --description boom\n"
+        "bogus\n"
+        "add --type expense --date 2025-11-31x --amount 1\n"
+        "shell\n"
+        "add --type expense --date 2025-11-03 --amount 7 --category Ghost\n"
+        "balance\n"
+        "exit\n"
+        "add --type income --date 2025-11-04 --amount 1000\n"
+    ))
+    code, out = _run(capsys, "--db", path, "shell")
+
+    assert code == 0
+    assert opened == [path]
+    assert cli._shared_conns == {}
+    assert "Added transaction 1" in out
+    assert "Unhandled error: boom" in out
+    assert "Error: date must be in YYYY-MM-DD format" in out
+    assert "Error: already in a shell" in out
+    assert "Added transaction 2" in out
+    assert "Balance: 93.00" in out
+    # Nothing after exit runs
+    assert "Added transaction 3" not in out
+
+    # The failed add rolled back its category; the later add created it again
+    conn = real_connect(path)
+    assert [name for _, name in db.get_categories(conn)] == ["Ghost", "Salary"]
+    assert [r[2] for r in db.list_transactions(conn)] == [7.0, 100.0]
+    conn.close()
+
+
+def test_shell_stops_at_eof(tmp_path, capsys, monkeypatch):
+    path = _init_db(tmp_path, capsys)
+    monkeypatch.setattr("sys.stdin", io.StringIO("add-category Food\n"))
+    code, out = _run(capsys, "--db", path, "shell")
+    assert code == 0
+    assert "Category 'Food' -> id 1" in out
+    assert cli._shared_conns == {}
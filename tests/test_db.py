@@ -1,39 +1,142 @@
-import os
-import tempfile
 import sqlite3
+from contextlib import closing
+
+import pytest
 
 from budget_manager import db
 
-def test_add_category_and_transactions():
-    # Use a temporary file database
-    fd, path = tempfile.mkstemp(suffix=".db")
-    os.close(fd)
-    try:
-        db.init_db(path)
-        conn = db.connect(path)
 
+@pytest.fixture
+def path(tmp_path):
+    # A file database (WAL needs one); pytest removes the directory, including
+    # the -wal/-shm files next to the database
+    path = str(tmp_path / "budget.db")
+    db.init_db(path)
+    return path
+
+
+def test_add_category_and_transactions(path):
+    conn = db.connect(path)
+
+    with conn:
         # Add category
         cat_id = db.add_category(conn, "TestCat")
         assert isinstance(cat_id, int)
+        assert db.add_category(conn, " TestCat ") == cat_id
 
         # Add income and expense
         t1 = db.add_transaction(conn, date="2025-11-01", amount=100.0, ttype="income", category="TestCat", description="Salary")
         t2 = db.add_transaction(conn, date="2025-11-02", amount=25.5, ttype="expense", category="TestCat", description="Lunch")
 
-        # List transactions
-        rows = db.list_transactions(conn)
-        assert len(rows) >= 2
+    # List transactions
+    rows = list(db.list_transactions(conn))
+    assert len(rows) >= 2
+
+    # Balance
+    bal = db.get_balance(conn)
+    assert abs(bal - (100.0 - 25.5)) < 1e-6
+
+    # Monthly report
+    report = db.monthly_report(conn, 2025, 11)
+    assert report["income"] >= 100.0
+    assert report["expense"] >= 25.5
+    conn.close()
+
+
+def test_add_transactions_bulk(path):
+    conn = db.connect(path)
+
+    rows = [
+        {"date": "2025-11-01", "amount": "1000", "type": "income", "category": "Salary", "description": ""},
+        {"date": "2025-11-03", "amount": "40.25", "type": "expense", "category": "Groceries", "description": "Market"},
+        {"date": "2025-11-04", "amount": "9.75", "type": "expense", "category": "", "description": None},
+    ]
+    with conn:
+        assert db.add_transactions_bulk(conn, rows) == 3
+    assert abs(db.get_balance(conn) - (1000 - 40.25 - 9.75)) < 1e-6
+    assert sorted(name for _, name in db.get_categories(conn)) == ["Groceries", "Salary"]
+
+    # A bad row rejects the whole batch
+    try:
+        db.add_transactions_bulk(conn, [rows[0], {"date": "11/05/2025", "amount": "1", "type": "income"}])
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert len(list(db.list_transactions(conn))) == 3
+    conn.close()
 
-        # Balance
-        bal = db.get_balance(conn)
-        assert abs(bal - (100.0 - 25.5)) < 1e-6
 
-        # Monthly report
-        report = db.monthly_report(conn, 2025, 11)
-        assert report["income"] >= 100.0
-        assert report["expense"] >= 25.5
-    finally:
+def test_add_transaction_rejects_bad_dates():
+    conn = db.connect(":memory:")
+    for bad in ("2025-13-01", "2025-11-00", "2025-1-05", "11/05/2025", "2025-11-01\n", ""):
         try:
-            os.remove(path)
-        except Exception:
+            db.add_transaction(conn, date=bad, amount=1.0, ttype="income")
+            assert False, f"expected ValueError for {bad!r}"
+        except ValueError:
             pass
+    conn.close()
+
+
+def test_category_cache_cleared_when_commit_fails():
+    conn = db.connect(":memory:")
+    conn.executescript(db.SCHEMA)
+    try:
+        with conn:
+            db.add_category(conn, "Rolled back")
+            # Defer the foreign key check so the violation surfaces at COMMIT
+            # (the pragma resets at the end of every transaction)
+            conn.execute("PRAGMA defer_foreign_keys = ON")
+            conn.execute("INSERT INTO transactions(date, amount, type, category_id) VALUES('2025-11-01', 1, 'income', 9999)")
+        assert False, "expected the commit to fail"
+    except sqlite3.IntegrityError:
+        pass
+    assert db.get_categories(conn) == []
+    assert conn._cat_cache == {}
+    conn.close()
+
+
+def test_add_transactions_bulk_keeps_category_ids_contiguous(path):
+    rows = [{"date": "2025-11-01", "amount": "3", "type": "expense", "category": "Food"}]
+    # Separate connections, so the second import and the add cannot use a cache
+    for _ in range(2):
+        with closing(db.connect(path)) as conn, conn:
+            db.add_transactions_bulk(conn, rows)
+    with closing(db.connect(path)) as conn, conn:
+        db.add_transactions_bulk(conn, rows + [dict(rows[0], category="Rent")])
+    with closing(db.connect(path)) as conn, conn:
+        db.add_category(conn, "New")
+        assert db.get_categories(conn) == [(1, "Food"), (3, "New"), (2, "Rent")]
+
+
+def test_add_category_existing_name_from_another_connection(path):
+    first = db.connect(path)
+    second = db.connect(path)
+    with first:
+        cat_id = db.add_category(first, "Shared")
+    # second has never seen the name, so this goes past its cache to SQL
+    with second:
+        assert db.add_category(second, "Shared") == cat_id
+        assert db.add_category(second, "Other") == cat_id + 1
+    assert db.get_categories(first) == [(cat_id + 1, "Other"), (cat_id, "Shared")]
+    first.close()
+    second.close()
+
+    # Lose the race: another connection creates the name right after our
+    # lookup, which is made to come back empty
+    racing = db.connect(path)
+    real_execute = racing.execute
+    racing.raced = False
+
+    def execute(sql, *args):
+        if not racing.raced and sql.lstrip().upper().startswith("SELECT"):
+            racing.raced = True
+            with closing(db.connect(path)) as other, other:
+                db.add_category(other, "Raced")
+            return real_execute("SELECT id FROM categories WHERE 0")
+        return real_execute(sql, *args)
+
+    racing.execute = execute
+    with racing:
+        assert db.add_category(racing, "Raced") == cat_id + 2
+    assert racing.raced
+    racing.close()